@@ -0,0 +1,84 @@
+"""
+=========================================================
+Classifying digits with a Bernoulli RBM feature extractor
+=========================================================
+
+This example trains a pipeline made of a :class:`BernoulliRBM
+<sklearn.rbm.BernoulliRBM>` feature extractor and a
+:class:`LogisticRegression <sklearn.linear_model.LogisticRegression>`
+classifier on the digits dataset. The hyper-parameters of the RBM
+(learning rate, hidden layer size, number of iterations) and of the
+logistic regression (regularization strength) are selected on a
+validation set.
+
+Instead of training every grid point from scratch, RBMs are shared
+along the ``n_iter`` dimension of the grid: the 20-epoch model is the
+10-epoch model advanced by ten more epochs with ``partial_fit``, which
+roughly halves the RBM training work of the search.
+"""
+print __doc__
+
+import numpy as np
+
+from sklearn import datasets, metrics
+from sklearn.cross_validation import train_test_split
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from sklearn.rbm import BernoulliRBM
+
+###############################################################################
+# Setting up
+
+digits = datasets.load_digits()
+X = np.asarray(digits.data, dtype=np.float64)
+X /= X.max()  # 0-1 scaling
+Y = digits.target
+
+X_train, X_test, Y_train, Y_test = train_test_split(X, Y, test_size=0.2,
+                                                    random_state=0)
+X_fit, X_val, Y_fit, Y_val = train_test_split(X_train, Y_train,
+                                              test_size=0.2, random_state=0)
+
+###############################################################################
+# Training
+
+best_score = -np.inf
+best = None
+
+for n_components in [100, 400]:
+    for learning_rate in [0.1, 0.01, 0.001]:
+        rbm = BernoulliRBM(n_components=n_components,
+                           learning_rate=learning_rate, random_state=0)
+        n_done = 0
+        for n_iter in [10, 20]:
+            # extend the same RBM instead of refitting from scratch
+            rbm.partial_fit(X_fit, n_iter=n_iter - n_done)
+            n_done = n_iter
+
+            F_fit = rbm.transform(X_fit)
+            F_val = rbm.transform(X_val)
+
+            for C in [1e3, 1e4]:
+                logistic = LogisticRegression(C=C)
+                logistic.fit(F_fit, Y_fit)
+                score = logistic.score(F_val, Y_val)
+                if score > best_score:
+                    best_score = score
+                    best = {'n_components': n_components,
+                            'learning_rate': learning_rate,
+                            'n_iter': n_iter, 'C': C}
+
+###############################################################################
+# Evaluation
+
+rbm = BernoulliRBM(n_components=best['n_components'],
+                   learning_rate=best['learning_rate'],
+                   n_iter=best['n_iter'], random_state=0)
+logistic = LogisticRegression(C=best['C'])
+classifier = Pipeline([('rbm', rbm), ('logistic', logistic)])
+classifier.fit(X_train, Y_train)
+
+report = metrics.classification_report(Y_test, classifier.predict(X_test))
+
+print "Best parameters: %s" % best
+print "Classification report for the best classifier:\n%s" % report
@@ -67,7 +67,7 @@ else:
                'feature_selection', 'semi_supervised',
                'gaussian_process', 'grid_search', 'hmm', 'lda', 'linear_model',
                'metrics', 'mixture', 'naive_bayes', 'neighbors', 'pipeline',
-               'preprocessing', 'qda', 'svm', 'test', 'clone', 'pls']
+               'preprocessing', 'qda', 'rbm', 'svm', 'test', 'clone', 'pls']
 
 
 def setup_module(module):
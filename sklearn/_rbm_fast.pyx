@@ -0,0 +1,57 @@
+# cython: boundscheck=False, wraparound=False, cdivision=True
+"""Element-wise kernels for the RBM hot loops.
+
+OpenMP-parallel, auto-vectorizable replacements for the clamped sigmoid
+and the Bernoulli thresholding, used by sklearn.rbm when Numba is not
+available.
+"""
+
+# Author: Yann N. Dauphin <dauphiya@iro.umontreal.ca>
+# License: BSD Style.
+
+import numpy as np
+
+cimport numpy as np
+from cython.parallel import prange
+from libc.math cimport exp
+
+np.import_array()
+
+ctypedef fused floating:
+    np.float32_t
+    np.float64_t
+
+
+def sigmoid_inplace(floating[:, :] A):
+    """Clamped logistic function ``1 / (1 + exp(-A))`` applied in-place.
+
+    The clamp to [-30, 30] only protects exp against overflow.
+    """
+    cdef Py_ssize_t n = A.shape[0]
+    cdef Py_ssize_t m = A.shape[1]
+    cdef Py_ssize_t i, j
+    cdef floating z
+
+    for i in prange(n, nogil=True, schedule='static'):
+        for j in range(m):
+            z = A[i, j]
+            if z > 30.:
+                z = 30.
+            elif z < -30.:
+                z = -30.
+            A[i, j] = 1. / (1. + exp(-z))
+
+
+def bernoulli_threshold(double[:, :] U, floating[:, :] P):
+    """Overwrite the uniform draws ``U`` with ``1. if U < P else 0.``.
+
+    Turns a matrix of uniforms into Bernoulli samples of mean ``P``
+    without allocating a result array.
+    """
+    cdef Py_ssize_t n = U.shape[0]
+    cdef Py_ssize_t m = U.shape[1]
+    cdef Py_ssize_t i, j
+
+    for i in prange(n, nogil=True, schedule='static'):
+        for j in range(m):
+            U[i, j] = 1. if U[i, j] < P[i, j] else 0.
@@ -0,0 +1,1239 @@
+"""Restricted Boltzmann Machine
+"""
+
+# Main author: Yann N. Dauphin <dauphiya@iro.umontreal.ca>
+# License: BSD Style.
+
+import math
+
+import numpy as np
+from scipy import linalg
+
+from .base import BaseEstimator, TransformerMixin
+from .externals.joblib import Parallel, delayed, cpu_count
+from .utils import check_random_state
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+try:
+    from . import _rbm_fast
+except ImportError:
+    _rbm_fast = None
+
+_gemm_funcs = {}
+
+
+def _blas_gemm(dtype):
+    """Return the BLAS gemm routine for ``dtype``, cached per dtype.
+
+    Resolved at call time instead of being stored on the estimator:
+    the f2py function objects returned by scipy cannot be pickled, and
+    keeping one as an attribute would break model persistence.
+    """
+    gemm = _gemm_funcs.get(dtype.char)
+    if gemm is None:
+        gemm, = linalg.get_blas_funcs(('gemm',),
+                                      (np.empty(0, dtype=dtype),))
+        _gemm_funcs[dtype.char] = gemm
+    return gemm
+
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _sigmoid_kernel(x, out):
+        """Clamped logistic function, fused in a single pass.
+
+        Clamping, negation and the exponential are applied element-wise
+        without materializing intermediate arrays, which keeps the
+        computation bandwidth-bound on a single sweep over ``x``.
+        """
+        for i in prange(x.shape[0]):
+            for j in range(x.shape[1]):
+                v = x[i, j]
+                if v > 30.:
+                    v = 30.
+                elif v < -30.:
+                    v = -30.
+                out[i, j] = 1. / (1. + math.exp(-v))
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _softplus_rowsum(A, b, out):
+        """Row-wise sum of ``softplus(A[i, j] + b[j])`` in one pass.
+
+        Uses the overflow-safe formulation
+        ``softplus(z) = max(z, 0) + log1p(exp(-|z|))``, so no clamping
+        of the pre-activations is needed and no intermediate matrix is
+        materialized.
+        """
+        for i in prange(A.shape[0]):
+            s = 0.
+            for j in range(A.shape[1]):
+                z = A[i, j] + b[j]
+                if z > 0.:
+                    s += z + math.log1p(math.exp(-z))
+                else:
+                    s += math.log1p(math.exp(z))
+            out[i] = s
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _col_sum_diff(A, B, out):
+        """Column-wise ``A.sum(0) - B.sum(0)`` in one pass over each.
+
+        Fuses the two reductions and their subtraction, so neither sum
+        is materialized on its own.
+        """
+        for j in prange(A.shape[1]):
+            s = 0.
+            for i in range(A.shape[0]):
+                s += A[i, j]
+            for i in range(B.shape[0]):
+                s -= B[i, j]
+            out[j] = s
+
+    @njit(fastmath=True, cache=True)
+    def _numba_epoch(Xs, W, b, c, h_samples, W_vel, b_vel, c_vel,
+                     lr, momentum, bs, seed, compute_pl):
+        """Run one full training epoch without leaving compiled code.
+
+        All per-minibatch work happens inside this driver: the gemms go
+        through np.dot (lowered to BLAS), the sigmoids, Bernoulli
+        sampling and momentum updates are explicit loops, and the
+        pseudo-likelihood is derived from the positive pre-activation
+        when requested. This removes the per-minibatch Python dispatch,
+        which dominates at the default batch size of 10. Parallelism
+        comes from the BLAS threads; the driver itself is sequential to
+        keep the update order of SGD.
+
+        Returns the summed pseudo-likelihood of the epoch (0. unless
+        ``compute_pl``).
+        """
+        np.random.seed(seed)
+        n, D = Xs.shape
+        K = W.shape[1]
+        n_chain = h_samples.shape[0]
+        pl = 0.
+
+        for start in range(0, n, bs):
+            end = min(start + bs, n)
+            v_pos = Xs[start:end]
+            m = end - start
+
+            pre_h = np.dot(v_pos, W)
+
+            if compute_pl:
+                for i in range(m):
+                    vc = 0.
+                    for k in range(D):
+                        vc += v_pos[i, k] * c[k]
+                    s = 0.
+                    for j in range(K):
+                        z = pre_h[i, j] + b[j]
+                        if z > 0.:
+                            s += z + math.log1p(math.exp(-z))
+                        else:
+                            s += math.log1p(math.exp(z))
+                    flip = np.random.randint(0, D)
+                    delta = 1. - 2. * v_pos[i, flip]
+                    s_ = 0.
+                    for j in range(K):
+                        z = pre_h[i, j] + b[j] + delta * W[flip, j]
+                        if z > 0.:
+                            s_ += z + math.log1p(math.exp(-z))
+                        else:
+                            s_ += math.log1p(math.exp(z))
+                    fe = - vc - s
+                    fe_ = - (vc + delta * c[flip]) - s_
+                    # log(sigmoid(fe_ - fe)) = -softplus(fe - fe_)
+                    z = fe - fe_
+                    if z > 0.:
+                        pl -= D * (z + math.log1p(math.exp(-z)))
+                    else:
+                        pl -= D * math.log1p(math.exp(z))
+
+            h_pos = pre_h
+            for i in range(m):
+                for j in range(K):
+                    z = pre_h[i, j] + b[j]
+                    if z > 30.:
+                        z = 30.
+                    elif z < -30.:
+                        z = -30.
+                    h_pos[i, j] = 1. / (1. + math.exp(-z))
+
+            v_neg = np.dot(h_samples, W.T)
+            for i in range(n_chain):
+                for k in range(D):
+                    z = v_neg[i, k] + c[k]
+                    if z > 30.:
+                        z = 30.
+                    elif z < -30.:
+                        z = -30.
+                    p = 1. / (1. + math.exp(-z))
+                    v_neg[i, k] = 1. if np.random.random() < p else 0.
+
+            h_neg = np.dot(v_neg, W)
+            for i in range(n_chain):
+                for j in range(K):
+                    z = h_neg[i, j] + b[j]
+                    if z > 30.:
+                        z = 30.
+                    elif z < -30.:
+                        z = -30.
+                    h_neg[i, j] = 1. / (1. + math.exp(-z))
+
+            lr_m = lr / m
+            dW_pos = np.dot(v_pos.T, h_pos)
+            dW_neg = np.dot(v_neg.T, h_neg)
+            for k in range(D):
+                for j in range(K):
+                    W_vel[k, j] = momentum * W_vel[k, j] \
+                        + lr_m * (dW_pos[k, j] - dW_neg[k, j])
+                    W[k, j] += W_vel[k, j]
+
+            for j in range(K):
+                s = 0.
+                for i in range(m):
+                    s += h_pos[i, j]
+                for i in range(n_chain):
+                    s -= h_neg[i, j]
+                b_vel[j] = momentum * b_vel[j] + lr_m * s
+                b[j] += b_vel[j]
+
+            for k in range(D):
+                s = 0.
+                for i in range(m):
+                    s += v_pos[i, k]
+                for i in range(n_chain):
+                    s -= v_neg[i, k]
+                c_vel[k] = momentum * c_vel[k] + lr_m * s
+                c[k] += c_vel[k]
+
+            for i in range(n_chain):
+                for j in range(K):
+                    h_samples[i, j] = \
+                        1. if np.random.random() < h_neg[i, j] else 0.
+
+        return pl
+else:
+    def _sigmoid_kernel(x, out):
+        """Clamped logistic function (no-Numba fallback).
+
+        Prefers the OpenMP Cython kernel from _rbm_fast; without it,
+        runs entirely in ``out``: clip, negate, exp, increment and
+        reciprocal, so no temporary array is created. The clip to
+        [-30, 30] only guards exp against overflow (exp(-30) ~ 1e-13).
+        """
+        if _rbm_fast is not None:
+            if out is not x:
+                out[:] = x
+            _rbm_fast.sigmoid_inplace(out)
+            return
+        np.clip(x, -30, 30, out=out)
+        np.negative(out, out)
+        np.exp(out, out)
+        out += 1.
+        np.reciprocal(out, out)
+
+    def _softplus_rowsum(A, b, out):
+        """Row-wise sum of ``softplus(A + b)`` (NumPy fallback).
+
+        Overflow-safe: ``softplus(z) = max(z, 0) + log1p(exp(-|z|))``.
+        """
+        z = A + b
+        np.maximum(z, 0.).sum(axis=1, out=out)
+        np.abs(z, out=z)
+        np.negative(z, out=z)
+        np.exp(z, out=z)
+        np.log1p(z, out=z)
+        out += z.sum(axis=1)
+
+    def _col_sum_diff(A, B, out):
+        """Column-wise ``A.sum(0) - B.sum(0)`` (NumPy fallback)."""
+        np.sum(A, axis=0, out=out)
+        out -= B.sum(axis=0)
+
+
+def _gradient_shard(W, b, c, X_shard, batch_size, seed, h_samples):
+    """
+    Accumulate SML gradients over the minibatches of one data shard.
+
+    Runs in a joblib worker on a read-only copy of the parameters, with
+    its own random state; the per-minibatch gradients (each normalized
+    by its batch size) are summed so the caller can average the shards
+    into a single update. The shard's fantasy particles come in as
+    ``h_samples`` and their advanced state is returned, so the caller
+    can keep each shard's chain persistent across epochs.
+
+    Parameters
+    ----------
+    W : array-like, shape (n_features, n_components)
+
+    b : array-like, shape (n_components,)
+
+    c : array-like, shape (n_features,)
+
+    X_shard : array-like, shape (n_shard_samples, n_features)
+
+    batch_size : int
+
+    seed : int
+        Seed for the worker-local random state.
+
+    h_samples : array-like, shape (n_chain, n_components)
+        State of the shard's fantasy particles, advanced in place.
+
+    Returns
+    -------
+    dW, db, dc : arrays shaped like ``W``, ``b`` and ``c``
+        Summed gradients of the shard.
+
+    h_samples : array-like, shape (n_chain, n_components)
+        The advanced fantasy particles.
+    """
+    rng = check_random_state(seed)
+    dW = np.zeros_like(W)
+    db = np.zeros_like(b)
+    dc = np.zeros_like(c)
+
+    for start in xrange(0, X_shard.shape[0], batch_size):
+        v_pos = X_shard[start:start + batch_size]
+        scale = 1. / v_pos.shape[0]
+
+        h_pos = np.dot(v_pos, W) + b
+        _sigmoid_kernel(h_pos, h_pos)
+
+        v_neg = np.dot(h_samples, W.T) + c
+        _sigmoid_kernel(v_neg, v_neg)
+        np.less(rng.uniform(size=v_neg.shape), v_neg, out=v_neg)
+
+        h_neg = np.dot(v_neg, W) + b
+        _sigmoid_kernel(h_neg, h_neg)
+
+        dW += scale * (np.dot(v_pos.T, h_pos) - np.dot(v_neg.T, h_neg))
+        db += scale * (h_pos.sum(0) - h_neg.sum(0))
+        dc += scale * (v_pos.sum(0) - v_neg.sum(0))
+
+        np.less(rng.uniform(size=h_neg.shape), h_neg, out=h_samples)
+
+    return dW, db, dc, h_samples
+
+
+class BernoulliRBM(BaseEstimator, TransformerMixin):
+    """
+    Bernoulli Restricted Boltzmann Machine (RBM)
+
+    A Restricted Boltzmann Machine with binary visible units and
+    binary hiddens. Parameters are estimated using Stochastic Maximum
+    Likelihood (SML) also known as Persistent Contrastive Divergence
+    (PCD).
+
+    The time complexity of this implementation is ``O(d ** 2)`` assuming
+    d ~ n_features ~ n_components.
+
+    Parameters
+    ----------
+    n_components : int, optional
+        Number of binary hidden units
+
+    learning_rate : float, optional
+        Learning rate to use during learning. It is *highly* recommended
+        to tune this hyper-parameter. Possible values are 10**[0., -3.].
+
+    n_samples : int, optional
+        Number of fantasy particles (samples) to use during learning.
+        This is also the size of the minibatches used during learning.
+
+    momentum : float, optional
+        Momentum coefficient applied to the parameter updates: each
+        update is the gradient plus ``momentum`` times the previous
+        update. Speeds up convergence considerably; set to 0. for plain
+        SGD.
+
+    n_iter : int, optional
+        Number of iterations/sweeps over the training dataset to perform
+        during training.
+
+    n_jobs : int, optional
+        Number of parallel jobs to use during learning. When greater
+        than one, each epoch splits the shuffled data into ``n_jobs``
+        shards whose gradients are computed in parallel, averaged and
+        applied as a single update per epoch; each shard runs its own
+        persistent chain of fantasy particles, carried across epochs.
+        This optimizes the same objective but with much larger
+        effective batches than the
+        sequential ``n_jobs=1`` SGD, so it may need a larger learning
+        rate or more iterations to reach the same likelihood. -1 means
+        'all CPUs'. Ignored when ``device='cuda'``.
+
+    device : 'cpu' | 'cuda', optional
+        Where to run training. 'cuda' requires CuPy and keeps the
+        parameters, fantasy particles and minibatches on the GPU for
+        the whole fit; the learned parameters are copied back to host
+        arrays afterwards, so transform and friends behave identically.
+
+    warm_start : bool, optional
+        When True, calling fit on a fitted model refines the existing
+        parameters instead of reinitializing them, so training can be
+        resumed, e.g. across the points of a hyper-parameter grid. See
+        also ``partial_fit``, which additionally leaves the number of
+        extra epochs to the caller.
+
+    verbose : bool, optional
+        When True (False by default) the method outputs the progress
+        of learning after each iteration.
+
+    random_state : integer or numpy.RandomState, optional
+        A random number generator instance to define the state of the
+        random permutations generator. If an integer is given, it fixes
+        the seed. Defaults to the global numpy random number generator.
+
+    Attributes
+    ----------
+    W : array-like, shape (n_features, n_components)
+        Weight matrix, where n_features is the number of visible units
+        and n_components is the number of hidden units.
+
+    b : array-like, shape (n_components,)
+        Biases of the hidden units.
+
+    c : array-like, shape (n_features,)
+        Biases of the visible units.
+
+    Examples
+    --------
+
+    >>> import numpy as np
+    >>> from sklearn.rbm import BernoulliRBM
+    >>> X = np.array([[0, 0, 0], [0, 1, 1], [1, 0, 1], [1, 1, 1]])
+    >>> model = BernoulliRBM(n_components=2)
+    >>> model.fit(X)               # doctest: +ELLIPSIS +NORMALIZE_WHITESPACE
+    BernoulliRBM(device='cpu', learning_rate=0.1, momentum=0.9, n_components=2,
+           n_iter=10, n_jobs=1, n_samples=10,
+           random_state=<mtrand.RandomState object at 0x...>, verbose=False,
+           warm_start=False)
+
+    References
+    ----------
+
+    [1] Hinton, G. E., Osindero, S. and Teh, Y. A fast learning algorithm
+        for deep belief nets. Neural Computation 18, pp 1527-1554.
+        http://www.cs.toronto.edu/~hinton/absps/fastnc.pdf
+
+    [2] Tieleman, T. Training Restricted Boltzmann Machines using
+        Approximations to the Likelihood Gradient. International
+        Conference on Machine Learning (ICML) 2008
+    """
+    def __init__(self, n_components=1024, learning_rate=0.1, n_samples=10,
+                 n_iter=10, momentum=0.9, n_jobs=1, device='cpu',
+                 warm_start=False, verbose=False, random_state=None):
+        self.n_components = n_components
+        self.learning_rate = learning_rate
+        self.n_samples = n_samples
+        self.n_iter = n_iter
+        self.momentum = momentum
+        self.n_jobs = n_jobs
+        self.device = device
+        self.warm_start = warm_start
+        self.verbose = verbose
+        self.random_state = random_state
+
+    def _sigmoid(self, x, out=None):
+        """
+        Implements the logistic function.
+
+        The clamping to [-30, 30] (for overflow protection), negation,
+        exponential and reciprocal are fused into a single pass over the
+        input, writing the result into ``out``.
+
+        Parameters
+        ----------
+        x : array-like, shape (M, N)
+
+        out : array-like, shape (M, N), optional
+            Preallocated output buffer. May alias ``x``, in which case
+            the computation is done in-place. Allocated if not given.
+
+        Returns
+        -------
+        x_new : array-like, shape (M, N)
+        """
+        if out is None:
+            out = np.empty_like(x)
+        if x.ndim == 1:
+            _sigmoid_kernel(x.reshape(1, -1), out.reshape(1, -1))
+        else:
+            _sigmoid_kernel(x, out)
+        return out
+
+    def _buffer(self, name, shape):
+        """
+        Return the preallocated buffer ``name``, reallocating it only
+        when the requested shape (typically the batch size) changes.
+
+        Parameters
+        ----------
+        name : str
+            Name of the attribute holding the buffer.
+
+        shape : tuple
+
+        Returns
+        -------
+        buf : array, Fortran-ordered, dtype of ``self.W``
+        """
+        buf = getattr(self, name, None)
+        if buf is None or buf.shape != shape:
+            buf = np.empty(shape, dtype=self.W.dtype, order='F')
+            setattr(self, name, buf)
+        return buf
+
+    def _sample_bernoulli(self, p, out=None):
+        """
+        Draw Bernoulli samples by thresholding uniforms against ``p``.
+
+        Much cheaper than ``random_state.binomial`` on full matrices:
+        one uniform draw and one comparison, overwriting the uniforms
+        in-place instead of allocating an int64 result.
+
+        Parameters
+        ----------
+        p : array-like
+            Bernoulli means, in [0, 1].
+
+        out : array-like, same shape as ``p``, optional
+            Preallocated output buffer.
+
+        Returns
+        -------
+        samples : array-like, same shape as ``p``
+            0/1 samples, of dtype ``p.dtype`` (or ``out``'s).
+        """
+        u = self.random_state.uniform(size=p.shape)
+        if _rbm_fast is not None and u.ndim == 2:
+            _rbm_fast.bernoulli_threshold(u, p)
+        else:
+            np.less(u, p, out=u)
+        if out is None:
+            if p.dtype == u.dtype:
+                return u
+            return u.astype(p.dtype)
+        out[:] = u
+        return out
+
+    def _row_index(self, n):
+        """
+        Return a cached ``np.arange(n)``, grown on demand, to avoid
+        materializing a fresh index array on every call.
+
+        Parameters
+        ----------
+        n : int
+
+        Returns
+        -------
+        rows : array, shape (n,)
+        """
+        rows = getattr(self, '_row_idx', None)
+        if rows is None or rows.shape[0] < n:
+            rows = np.arange(n)
+            self._row_idx = rows
+        return rows[:n]
+
+    @property
+    def _gemm(self):
+        """BLAS gemm matching the dtype of ``W`` (see :func:`_blas_gemm`)."""
+        return _blas_gemm(self.W.dtype)
+
+    def _gemm_bias(self, a, b, bias, out, trans_b=0):
+        """
+        Computes ``a * op(b) + bias`` into the preallocated buffer
+        ``out``, where ``op`` is the transpose if ``trans_b``.
+
+        The matrix product is dispatched to BLAS gemm writing directly
+        into ``out`` (which must be Fortran-ordered), and the bias is
+        broadcast-added in-place, so no full-size temporary is created.
+        ``b`` is expected Fortran-ordered and C-contiguous ``a`` is
+        passed as its transpose with trans_a set, so BLAS reads both
+        operands with unit stride and copies neither.
+
+        Parameters
+        ----------
+        a : array-like, shape (M, K)
+
+        b : array-like, shape (K, N), or (N, K) if ``trans_b``
+
+        bias : array-like, shape (N,), or None
+            When None, only the product is computed.
+
+        out : array, shape (M, N), Fortran-ordered
+
+        trans_b : int, 0 or 1, optional
+            Whether to use the transpose of ``b``.
+
+        Returns
+        -------
+        out : array, shape (M, N)
+        """
+        if a.dtype == out.dtype and b.dtype == out.dtype:
+            if a.flags.f_contiguous:
+                out = self._gemm(1.0, a, b, beta=0.0, c=out,
+                                 trans_b=trans_b, overwrite_c=1)
+            else:
+                out = self._gemm(1.0, a.T, b, beta=0.0, c=out, trans_a=1,
+                                 trans_b=trans_b, overwrite_c=1)
+        else:
+            out[:] = np.dot(a, b.T if trans_b else b)
+        if bias is not None:
+            np.add(out, bias, out=out)
+        return out
+
+    def transform(self, X):
+        """
+        Computes the probabilities ``P(h=1|v=X)``.
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+
+        Returns
+        -------
+        h : array-like, shape (n_samples, n_components)
+        """
+        # mean_h writes into a scratch buffer shared across calls; hand
+        # the caller a copy they own. This is off the training hot loop.
+        return self.mean_h(X).copy()
+
+    def mean_h(self, v, out=None):
+        """
+        Computes the probabilities ``P(h=1|v)``.
+
+        Parameters
+        ----------
+        v : array-like, shape (n_samples, n_features)
+
+        out : array-like, shape (n_samples, n_components), optional
+            Preallocated output buffer. Defaults to a buffer shared by
+            all ``mean_h`` calls, reallocated only when the batch size
+            changes.
+
+        Returns
+        -------
+        h : array-like, shape (n_samples, n_components)
+        """
+        if out is None:
+            out = self._buffer('_pre_h', (v.shape[0], self.n_components))
+        pre_h = self._gemm_bias(v, self.W, self.b, out)
+        return self._sigmoid(pre_h, out=pre_h)
+
+    def sample_h(self, v):
+        """
+        Sample from the distribution ``P(h|v)``.
+
+        Parameters
+        ----------
+        v : array-like, shape (n_samples, n_features)
+
+        Returns
+        -------
+        h : array-like, shape (n_samples, n_components)
+        """
+        return self._sample_bernoulli(self.mean_h(v))
+
+    def mean_v(self, h, out=None):
+        """
+        Computes the probabilities ``P(v=1|h)``.
+
+        Parameters
+        ----------
+        h : array-like, shape (n_samples, n_components)
+
+        out : array-like, shape (n_samples, n_features), optional
+            Preallocated output buffer. Defaults to a buffer shared by
+            all ``mean_v`` calls, reallocated only when the batch size
+            changes.
+
+        Returns
+        -------
+        v : array-like, shape (n_samples, n_features)
+        """
+        if out is None:
+            out = self._buffer('_pre_v', (h.shape[0], self.W.shape[0]))
+        pre_v = self._gemm_bias(h, self.W, self.c, out, trans_b=1)
+        return self._sigmoid(pre_v, out=pre_v)
+
+    def sample_v(self, h):
+        """
+        Sample from the distribution ``P(v|h)``.
+
+        Parameters
+        ----------
+        h : array-like, shape (n_samples, n_components)
+
+        Returns
+        -------
+        v : array-like, shape (n_samples, n_features)
+        """
+        return self._sample_bernoulli(self.mean_v(h))
+
+    def free_energy(self, v, out=None, pre_h=None):
+        """
+        Computes the free energy ``F(v) = - log sum_h exp(-E(v,h))``.
+
+        The hidden term ``log(1 + exp(v.W + b)).sum(1)`` is computed as
+        a numerically-stable softplus reduction streaming over the gemm
+        output, instead of materializing the exp and log matrices.
+
+        Parameters
+        ----------
+        v : array-like, shape (n_samples, n_features)
+
+        out : array-like, shape (n_samples,), optional
+            Preallocated output buffer. Allocated if not given.
+
+        pre_h : array-like, shape (n_samples, n_components), optional
+            Already computed ``v.W + b``, e.g. left over from mean_h on
+            the same ``v``; passing it skips the gemm entirely.
+
+        Returns
+        -------
+        free_energy : array-like, shape (n_samples,)
+        """
+        if out is None:
+            out = np.empty(v.shape[0], dtype=self.W.dtype)
+        if pre_h is None:
+            pre_h = self._gemm_bias(
+                v, self.W, None,
+                self._buffer('_pre_h', (v.shape[0], self.n_components)))
+            _softplus_rowsum(pre_h, self.b, out)
+        else:
+            # the bias is already folded into pre_h
+            _softplus_rowsum(pre_h, self._b0, out)
+        out += np.dot(v, self.c)
+        np.negative(out, out)
+        return out
+
+    def gibbs(self, v):
+        """
+        Perform one Gibbs sampling step.
+
+        Parameters
+        ----------
+        v : array-like, shape (n_samples, n_features)
+
+        Returns
+        -------
+        v_new : array-like, shape (n_samples, n_features)
+        """
+        h_ = self.sample_h(v)
+        v_ = self.sample_v(h_)
+
+        return v_
+
+    def _fit(self, v_pos):
+        """
+        Adjust the parameters to maximize the likelihood of ``v``
+        using Stochastic Maximum Likelihood (SML).
+
+        Parameters
+        ----------
+        v_pos : array-like, shape (n_samples, n_features)
+
+        Returns
+        -------
+        pseudo_likelihood : array-like, shape (n_samples,), or None
+            Pseudo-likelihood estimate for this batch, computed only
+            when verbose (None otherwise).
+        """
+        # Keep the positive-phase pre-activation: pseudo_likelihood can
+        # then reuse it instead of redoing the v_pos.W gemm, at the cost
+        # of one (batch, n_components) copy for the sigmoid.
+        pre_h_pos = self._gemm_bias(
+            v_pos, self.W, self.b,
+            self._buffer('_pre_h_pos', (v_pos.shape[0], self.n_components)))
+        h_pos = self._sigmoid(pre_h_pos,
+                              out=self._buffer('_h_pos', pre_h_pos.shape))
+        # h_samples is kept as uint8; cast into a reused float buffer at
+        # the gemm boundary so BLAS sees its native dtype.
+        h_float = self._buffer('_h_float', self.h_samples.shape)
+        h_float[:] = self.h_samples
+        v_neg = self._sample_bernoulli(
+            self.mean_v(h_float),
+            out=self._buffer('_v_neg', (h_float.shape[0], v_pos.shape[1])))
+        # h_pos lives in the shared mean_h buffer; give h_neg its own so
+        # the two can coexist during the update below.
+        h_neg = self.mean_h(v_neg, out=self._buffer(
+            '_pre_h_neg', (v_neg.shape[0], self.n_components)))
+
+        lr = self.learning_rate / v_pos.shape[0]
+
+        # dW = v_pos'.h_pos - v_neg'.h_neg accumulated in one buffer:
+        # beta folds the subtraction into the second gemm. v_pos is
+        # C-contiguous so its transpose is passed as-is; v_neg lives in
+        # a Fortran-ordered buffer so trans_a is used instead. Neither
+        # call copies an operand or allocates a result.
+        dW = self._dW
+        self._gemm(1.0, v_pos.T, h_pos, beta=0.0, c=dW, overwrite_c=1)
+        self._gemm(-1.0, v_neg, h_neg, beta=1.0, c=dW, trans_a=1,
+                   overwrite_c=1)
+        dW *= lr
+
+        _col_sum_diff(h_pos, h_neg, self._db)
+        self._db *= lr
+
+        _col_sum_diff(v_pos, v_neg, self._dc)
+        self._dc *= lr
+
+        # Evaluate before the update: pre_h_pos was computed against the
+        # current parameters, so the flip correction has to use the same
+        # W and c. The jitted driver does likewise, and likewise only
+        # pays for the estimate when it is going to be reported.
+        pl = None
+        if self.verbose:
+            pl = self._pseudo_likelihood(v_pos, pre_h=pre_h_pos)
+
+        self._apply_update(dW, self._db, self._dc)
+
+        # h_neg always has the shape of the chain, whatever the size of
+        # the positive batch, so the particles are advanced in place.
+        self._sample_bernoulli(h_neg, out=self.h_samples)
+
+        return pl
+
+    def _apply_update(self, dW, db, dc, momentum=None):
+        """
+        Apply a learning-rate-scaled gradient step with momentum.
+
+        The velocity buffers accumulate ``momentum`` times their
+        previous value plus the step, all in-place, and are added to
+        the parameters.
+
+        Parameters
+        ----------
+        dW, db, dc : arrays shaped like ``W``, ``b`` and ``c``
+            Gradient steps, already scaled by the learning rate.
+
+        momentum : float, optional
+            Defaults to ``self.momentum``.
+        """
+        if momentum is None:
+            momentum = self.momentum
+
+        self._W_vel *= momentum
+        self._W_vel += dW
+        self.W += self._W_vel
+
+        self._b_vel *= momentum
+        self._b_vel += db
+        self.b += self._b_vel
+
+        self._c_vel *= momentum
+        self._c_vel += dc
+        self.c += self._c_vel
+
+    def _fit_parallel(self, n_jobs, batch_size):
+        """
+        Run one epoch with the minibatch gradients computed in parallel.
+
+        The shuffled data is split into ``n_jobs`` shards; each worker
+        accumulates its shard's gradients against the current parameters
+        (see :func:`_gradient_shard`), and the averaged result is
+        applied as a single update. Every shard owns a persistent chain
+        of fantasy particles, carried across epochs, so the parallel
+        path keeps the persistence that SML relies on.
+
+        Parameters
+        ----------
+        n_jobs : int
+
+        batch_size : int
+
+        Returns
+        -------
+        pseudo_likelihood : float
+            Summed pseudo-likelihood of the epoch's data against the
+            pre-update parameters, computed only when verbose
+            (0. otherwise).
+        """
+        seeds = self.random_state.randint(0, 2 ** 31 - 1, n_jobs)
+        shards = np.array_split(self._Xs, n_jobs)
+        chains = getattr(self, '_shard_chains', None)
+        if chains is None or len(chains) != n_jobs:
+            chains = [np.zeros((min(batch_size, shard.shape[0]),
+                                self.n_components), dtype=self.W.dtype)
+                      for shard in shards]
+        results = Parallel(n_jobs=n_jobs)(
+            delayed(_gradient_shard)(self.W, self.b, self.c, shard,
+                                     batch_size, seed, chain)
+            for shard, seed, chain in zip(shards, seeds, chains))
+
+        self._dW.fill(0.)
+        self._db.fill(0.)
+        self._dc.fill(0.)
+        self._shard_chains = []
+        for dW, db, dc, chain in results:
+            self._dW += dW
+            self._db += db
+            self._dc += dc
+            self._shard_chains.append(chain)
+
+        scale = self.learning_rate / n_jobs
+        self._dW *= scale
+        self._db *= scale
+        self._dc *= scale
+
+        # as in the sequential paths, estimate against the parameters
+        # the gradients were computed from
+        pl = 0.
+        if self.verbose:
+            pl = self._pseudo_likelihood(self._Xs).sum()
+
+        self._apply_update(self._dW, self._db, self._dc)
+        return pl
+
+    def pseudo_likelihood(self, v, pre_h=None):
+        """
+        Rough estimate of the pseudo-likelihood of ``v``.
+
+        Parameters
+        ----------
+        v : array-like, shape (n_samples, n_features)
+
+        pre_h : array-like, shape (n_samples, n_components), optional
+            Already computed ``v.W + b``; passing it (e.g. from the
+            positive phase of _fit) makes this method gemm-free.
+
+        Returns
+        -------
+        pseudo_likelihood : array-like, shape (n_samples,)
+            Owned by the caller.
+        """
+        return self._pseudo_likelihood(v, pre_h=pre_h).copy()
+
+    def _pseudo_likelihood(self, v, pre_h=None):
+        """
+        As :meth:`pseudo_likelihood`, except that the result lives in a
+        scratch buffer shared across calls. For the training loops,
+        which consume it before calling again.
+        """
+        if pre_h is None:
+            pre_h = self._gemm_bias(
+                v, self.W, self.b,
+                self._buffer('_pre_h', (v.shape[0], self.n_components)))
+
+        fe = self._buffer('_fe', (v.shape[0],))
+        _softplus_rowsum(pre_h, self._b0, fe)
+        vc = np.dot(v, self.c)
+        fe += vc
+        np.negative(fe, fe)
+
+        # The flipped batch differs from v in exactly one column per
+        # row, so its pre-activation is the cached one plus (+-1) times
+        # the corresponding W row: one gather instead of a second gemm,
+        # and no flipped copy of v is ever built.
+        rows = self._row_index(v.shape[0])
+        i_ = (self.random_state.uniform(size=v.shape[0])
+              * v.shape[1]).astype(np.int)
+        delta = 1. - 2. * v[rows, i_]
+
+        pre_flip = self._buffer('_pre_flip', pre_h.shape)
+        pre_flip[:] = pre_h
+        pre_flip += delta[:, np.newaxis] * self.W[i_, :]
+
+        fe_ = self._buffer('_fe_flip', (v.shape[0],))
+        _softplus_rowsum(pre_flip, self._b0, fe_)
+        fe_ += vc
+        fe_ += delta * self.c[i_]
+        np.negative(fe_, fe_)
+
+        np.subtract(fe_, fe, out=fe_)
+        self._sigmoid(fe_, out=fe_)
+        np.log(fe_, out=fe_)
+        fe_ *= v.shape[1]
+        return fe_
+
+    def _fit_cuda(self, X):
+        """
+        Training loop on a CUDA device through CuPy.
+
+        The parameters, fantasy particles and the (shuffled) data all
+        live on the device for the whole fit: the gemms run on the GPU,
+        the clamped sigmoid is a single fused element-wise kernel, and
+        Bernoulli sampling thresholds device-side uniforms. Only the
+        learned parameters are copied back to host arrays at the end,
+        so the fitted estimator is indistinguishable from a CPU fit.
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features), float32
+
+        Returns
+        -------
+        self
+        """
+        import cupy
+
+        rs = self.random_state
+        cupy.random.seed(rs.randint(0, 2 ** 31 - 1))
+
+        @cupy.fuse()
+        def sigmoid(x):
+            return 1. / (1. + cupy.exp(-cupy.minimum(
+                cupy.maximum(x, -30.), 30.)))
+
+        def bernoulli(p):
+            return (cupy.random.random_sample(p.shape) < p) \
+                .astype(cupy.float32)
+
+        if self.warm_start and hasattr(self, 'W'):
+            W = cupy.asarray(np.ascontiguousarray(self.W))
+            b = cupy.asarray(self.b)
+            c = cupy.asarray(self.c)
+        else:
+            W = cupy.asarray(np.asarray(
+                rs.normal(0, 0.01, (X.shape[1], self.n_components)),
+                dtype=np.float32))
+            b = cupy.zeros(self.n_components, dtype=cupy.float32)
+            c = cupy.zeros(X.shape[1], dtype=cupy.float32)
+        h_samples = cupy.zeros((self.n_samples, self.n_components),
+                               dtype=cupy.float32)
+        W_vel = cupy.zeros_like(W)
+        b_vel = cupy.zeros_like(b)
+        c_vel = cupy.zeros_like(c)
+        Xd = cupy.asarray(X)
+
+        n_samples = X.shape[0]
+        bs = self.n_samples
+        rows = cupy.arange(n_samples)
+
+        for iteration in xrange(self.n_iter):
+            Xs = cupy.take(Xd, cupy.asarray(rs.permutation(n_samples)),
+                           axis=0)
+
+            for batch_start in xrange(0, n_samples, bs):
+                v_pos = Xs[batch_start:batch_start + bs]
+                h_pos = sigmoid(cupy.dot(v_pos, W) + b)
+                v_neg = bernoulli(sigmoid(cupy.dot(h_samples, W.T) + c))
+                h_neg = sigmoid(cupy.dot(v_neg, W) + b)
+
+                lr = self.learning_rate / v_pos.shape[0]
+                W_vel = self.momentum * W_vel + lr * (
+                    cupy.dot(v_pos.T, h_pos) - cupy.dot(v_neg.T, h_neg))
+                W += W_vel
+                b_vel = self.momentum * b_vel + lr * (
+                    h_pos.sum(0) - h_neg.sum(0))
+                b += b_vel
+                c_vel = self.momentum * c_vel + lr * (
+                    v_pos.sum(0) - v_neg.sum(0))
+                c += c_vel
+
+                h_samples = bernoulli(h_neg)
+
+            if self.verbose:
+                # device-side pseudo-likelihood of the epoch's data
+                i_ = cupy.asarray((rs.uniform(size=n_samples)
+                                   * X.shape[1]).astype(np.int))
+                Xs_ = Xs.copy()
+                Xs_[rows, i_] = 1. - Xs[rows, i_]
+
+                def free_energy(v):
+                    z = cupy.dot(v, W) + b
+                    softplus = cupy.maximum(z, 0.) \
+                        + cupy.log1p(cupy.exp(-cupy.abs(z)))
+                    return - cupy.dot(v, c) - softplus.sum(1)
+
+                pl = X.shape[1] * cupy.log(sigmoid(
+                    free_energy(Xs_) - free_energy(Xs)))
+                pl = float(pl.sum()) / n_samples
+                print "Iteration %d, pseudo-likelihood = %.2f" % (iteration, pl)
+
+        self.W = np.asfortranarray(cupy.asnumpy(W))
+        self.b = cupy.asnumpy(b)
+        self.c = cupy.asnumpy(c)
+        self.h_samples = cupy.asnumpy(h_samples).astype(np.uint8)
+        # host-side plumbing so transform/free_energy work as usual
+        self._b0 = np.zeros_like(self.b)
+
+        return self
+
+    def fit(self, X, y=None):
+        """
+        Fit the model to the data X.
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            Training data, where n_samples is the number of samples and
+            n_features is the number of features.
+
+        Returns
+        -------
+        self
+        """
+        # Train in single precision regardless of the input dtype: the
+        # SML gradient is a noisy estimate anyway, float32 halves the
+        # memory traffic of this bandwidth-bound fit and doubles the
+        # SIMD width of the BLAS and sigmoid kernels.
+        X = np.ascontiguousarray(X, dtype=np.float32)
+
+        self.random_state = check_random_state(self.random_state)
+
+        if self.device == 'cuda':
+            return self._fit_cuda(X)
+        elif self.device != 'cpu':
+            raise ValueError("Invalid device: %r" % self.device)
+
+        if not (self.warm_start and hasattr(self, 'W')):
+            self._init_parameters(X)
+        self._init_buffers(X)
+        self._run_epochs(X, self.n_iter)
+
+        return self
+
+    def partial_fit(self, X, y=None, n_iter=1):
+        """
+        Run ``n_iter`` additional training epochs on X.
+
+        The parameters are initialized on the first call and reused
+        afterwards regardless of ``warm_start``, so callers (e.g. a
+        hyper-parameter search over ``n_iter``) can extend a fitted
+        model epoch by epoch instead of retraining it from scratch.
+        Only available with device='cpu'.
+
+        Parameters
+        ----------
+        X : array-like, shape (n_samples, n_features)
+            Training data, where n_samples is the number of samples and
+            n_features is the number of features.
+
+        n_iter : int, optional
+            Number of epochs to run.
+
+        Returns
+        -------
+        self
+        """
+        if self.device != 'cpu':
+            raise ValueError("partial_fit is only available with "
+                             "device='cpu'")
+        X = np.ascontiguousarray(X, dtype=np.float32)
+
+        self.random_state = check_random_state(self.random_state)
+
+        if not hasattr(self, 'W'):
+            self._init_parameters(X)
+        if getattr(self, '_Xs', None) is None \
+                or self._Xs.shape != X.shape \
+                or getattr(self, '_dW', None) is None \
+                or self._dW.shape != self.W.shape:
+            self._init_buffers(X)
+        self._run_epochs(X, n_iter)
+
+        return self
+
+    def _init_parameters(self, X):
+        """
+        Allocate and initialize W, b, c and the fantasy particles.
+
+        Parameters
+        ----------
+        X : array, shape (n_samples, n_features), float32
+        """
+        # Fortran order makes both the v.W and h.W' products hit BLAS
+        # with unit-stride inner loops (see _gemm_bias).
+        self.W = np.asfortranarray(
+            self.random_state.normal(0, 0.01,
+                                     (X.shape[1], self.n_components)),
+            dtype=X.dtype)
+        self.b = np.zeros(self.n_components, dtype=X.dtype)
+        self.c = np.zeros(X.shape[1], dtype=X.dtype)
+        # Binary states only need a byte each; this keeps the fantasy
+        # particles 8x smaller than the float64 they used to occupy.
+        # Packing further to one bit per unit (64 states per uint64
+        # word, with a count-trailing-zeros loop summing the W columns
+        # of the set bits) was measured against this: with roughly half
+        # the bits set in a trained RBM, the gather-sum touches as much
+        # of W as dense gemm does but without SIMD accumulation, so the
+        # byte representation is the sweet spot here.
+        self.h_samples = np.zeros((self.n_samples, self.n_components),
+                                  dtype=np.uint8)
+
+    def _init_buffers(self, X):
+        """
+        Allocate the training buffers tied to the shapes of W and X.
+
+        Parameters
+        ----------
+        X : array, shape (n_samples, n_features), float32
+        """
+        # Gradient accumulators, written into by every minibatch rather
+        # than reallocated.
+        self._dW = np.empty_like(self.W)
+        self._db = np.empty(self.n_components, dtype=X.dtype)
+        self._dc = np.empty(X.shape[1], dtype=X.dtype)
+        # Momentum velocities.
+        self._W_vel = np.zeros_like(self.W)
+        self._b_vel = np.zeros_like(self.b)
+        self._c_vel = np.zeros_like(self.c)
+        # Zero hidden bias, for free_energy on pre-biased activations.
+        self._b0 = np.zeros_like(self.b)
+        self._pre_h = np.empty((self.n_samples, self.n_components),
+                               dtype=X.dtype, order='F')
+        self._pre_v = np.empty((self.n_samples, X.shape[1]),
+                               dtype=X.dtype, order='F')
+        # X is permuted once per epoch into this C-contiguous buffer;
+        # minibatches are then plain slices of it, so the per-minibatch
+        # gather copy of the previous scheme disappears.
+        self._Xs = np.empty(X.shape, dtype=X.dtype)
+
+    def _run_epochs(self, X, n_iter):
+        """
+        Run ``n_iter`` training epochs on the preprocessed data X.
+
+        Parameters
+        ----------
+        X : array, shape (n_samples, n_features), float32, C-contiguous
+
+        n_iter : int
+        """
+        n_samples = X.shape[0]
+        bs = self.n_samples
+        n_jobs = self.n_jobs if self.n_jobs > 0 else cpu_count()
+        # warm the row-index cache used by pseudo_likelihood
+        self._row_index(bs)
+
+        # With Numba present the sequential path runs whole epochs
+        # inside a jitted driver, which needs a float view of the chain.
+        use_driver = NUMBA_AVAILABLE and n_jobs == 1
+        if use_driver:
+            h_float = np.ascontiguousarray(self.h_samples, dtype=X.dtype)
+
+        for iteration in xrange(n_iter):
+            perm = self.random_state.permutation(n_samples)
+            np.take(X, perm, axis=0, out=self._Xs)
+
+            pl = 0.
+            if use_driver:
+                pl = _numba_epoch(self._Xs, self.W, self.b, self.c,
+                                  h_float, self._W_vel, self._b_vel,
+                                  self._c_vel, self.learning_rate,
+                                  self.momentum, bs,
+                                  self.random_state.randint(0, 2 ** 31 - 1),
+                                  1 if self.verbose else 0)
+            elif n_jobs == 1:
+                for batch_start in xrange(0, n_samples, bs):
+                    batch_pl = self._fit(
+                        self._Xs[batch_start:batch_start + bs])
+                    if self.verbose:
+                        pl += batch_pl.sum()
+            else:
+                pl = self._fit_parallel(n_jobs, bs)
+
+            if self.verbose:
+                pl /= X.shape[0]
+                print "Iteration %d, pseudo-likelihood = %.2f" % (iteration, pl)
+
+        if use_driver:
+            self.h_samples = h_float.astype(np.uint8)
@@ -1,8 +1,42 @@
 import os
 from os.path import join
+import shutil
+import tempfile
 import warnings
 
 
+def check_openmp_support():
+    """Check whether the default C compiler accepts ``-fopenmp``.
+
+    Some compilers do not (e.g. Apple's clang), in which case the
+    _rbm_fast kernels are built sequentially; their prange loops
+    degrade gracefully to plain loops without OpenMP.
+    """
+    from distutils.ccompiler import new_compiler
+    from distutils.errors import CompileError, LinkError
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        src = join(tmp_dir, 'test_openmp.c')
+        f = open(src, 'w')
+        try:
+            f.write("#include <omp.h>\n"
+                    "int main(void) { return omp_get_num_threads(); }\n")
+        finally:
+            f.close()
+        compiler = new_compiler()
+        try:
+            objects = compiler.compile([src], output_dir=tmp_dir,
+                                       extra_postargs=['-fopenmp'])
+            compiler.link_executable(objects, join(tmp_dir, 'test_openmp'),
+                                     extra_postargs=['-fopenmp'])
+        except (CompileError, LinkError):
+            return False
+        return True
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
 def configuration(parent_package='', top_path=None):
     from numpy.distutils.misc_util import Configuration
     from numpy.distutils.system_info import get_info, BlasNotFoundError
@@ -55,6 +89,24 @@ def configuration(parent_package='', top_path=None):
         libraries=libraries,
     )
 
+    # add cython extension module for the rbm kernels
+    rbm_compile_args = ['-O3']
+    rbm_link_args = []
+    if check_openmp_support():
+        rbm_compile_args.append('-fopenmp')
+        rbm_link_args.append('-fopenmp')
+    else:
+        warnings.warn("OpenMP is not supported by the compiler; "
+                      "building _rbm_fast without thread parallelism.")
+    config.add_extension(
+        '_rbm_fast',
+        sources=['_rbm_fast.c'],
+        include_dirs=[numpy.get_include()],
+        libraries=libraries,
+        extra_compile_args=rbm_compile_args,
+        extra_link_args=rbm_link_args,
+    )
+
     # some libs needs cblas, fortran-compiled BLAS will not be sufficient
     blas_info = get_info('blas_opt', 0)
     if (not blas_info) or (
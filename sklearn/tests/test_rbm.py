@@ -0,0 +1,126 @@
+import pickle
+
+import numpy as np
+from numpy.testing import assert_almost_equal, assert_array_equal
+
+from sklearn.datasets import load_digits
+from sklearn.rbm import BernoulliRBM
+
+Xdigits = load_digits().data
+Xdigits -= Xdigits.min()
+Xdigits /= Xdigits.max()
+
+
+def test_fit():
+    X = Xdigits.copy()
+
+    rbm = BernoulliRBM(n_components=64, learning_rate=0.1, n_samples=10,
+                       n_iter=7, random_state=9)
+    rbm.fit(X)
+
+    assert rbm.W.shape == (X.shape[1], 64)
+    assert rbm.b.shape == (64,)
+    assert rbm.c.shape == (X.shape[1],)
+
+    # training is carried out in single precision
+    assert rbm.W.dtype == np.float32
+    assert rbm.b.dtype == np.float32
+    assert rbm.c.dtype == np.float32
+
+    # in-place tricks shouldn't have modified X
+    assert_array_equal(X, Xdigits)
+
+
+def test_fit_n_jobs():
+    X = Xdigits[:200]
+    rbm = BernoulliRBM(n_components=16, n_iter=2, n_jobs=2, random_state=0)
+    rbm.fit(X)
+
+    assert rbm.W.shape == (X.shape[1], 16)
+    assert np.all(np.isfinite(rbm.W))
+
+
+def test_transform():
+    X = Xdigits[:100]
+    rbm = BernoulliRBM(n_components=16, n_iter=5, random_state=42)
+    rbm.fit(X)
+
+    Xt = rbm.transform(X)
+    assert Xt.shape == (X.shape[0], 16)
+    assert np.all(Xt >= 0.) and np.all(Xt <= 1.)
+
+
+def test_sigmoid():
+    rng = np.random.RandomState(0)
+    rbm = BernoulliRBM()
+    x = rng.randn(5, 3) * 20.
+    expected = 1. / (1. + np.exp(-np.clip(x, -30, 30)))
+    assert_almost_equal(rbm._sigmoid(x), expected)
+
+    # in-place application
+    buf = x.copy()
+    rbm._sigmoid(buf, out=buf)
+    assert_almost_equal(buf, expected)
+
+
+def test_sample_bernoulli():
+    rbm = BernoulliRBM(random_state=np.random.RandomState(5))
+    p = np.tile([0.1, 0.5, 0.9], (10000, 1))
+    samples = rbm._sample_bernoulli(p)
+
+    assert samples.shape == p.shape
+    assert np.all((samples == 0.) | (samples == 1.))
+    assert_almost_equal(samples.mean(0), p[0], decimal=1)
+
+
+def test_gibbs():
+    X = Xdigits[:100]
+    rbm = BernoulliRBM(n_components=16, n_iter=5, random_state=42)
+    rbm.fit(X)
+
+    X_new = rbm.gibbs(X)
+    assert X_new.shape == X.shape
+    assert np.all((X_new == 0.) | (X_new == 1.))
+
+
+def test_pickle():
+    X = Xdigits[:100]
+    rbm = BernoulliRBM(n_components=16, n_iter=2, random_state=42)
+    rbm.fit(X)
+
+    rbm2 = pickle.loads(pickle.dumps(rbm))
+    assert_array_equal(rbm.W, rbm2.W)
+    assert_almost_equal(rbm.transform(X[:10]), rbm2.transform(X[:10]))
+
+
+def test_partial_fit():
+    X = Xdigits[:100]
+    rbm = BernoulliRBM(n_components=16, random_state=42)
+    rbm.partial_fit(X, n_iter=2)
+    W = rbm.W.copy()
+
+    rbm.partial_fit(X, n_iter=2)
+    assert rbm.W.shape == W.shape
+    assert not np.allclose(W, rbm.W)
+
+
+def test_warm_start():
+    X = Xdigits[:100]
+    rbm = BernoulliRBM(n_components=16, n_iter=2, random_state=42,
+                       warm_start=True)
+    rbm.fit(X)
+    W = rbm.W.copy()
+
+    # the second fit refines the first instead of starting over
+    rbm.fit(X)
+    assert not np.allclose(W, rbm.W)
+
+
+def test_pseudo_likelihood():
+    X = Xdigits[:100]
+    rbm = BernoulliRBM(n_components=16, n_iter=5, random_state=42)
+    rbm.fit(X)
+
+    pl = rbm.pseudo_likelihood(X)
+    assert pl.shape == (X.shape[0],)
+    assert np.all(np.isfinite(pl))